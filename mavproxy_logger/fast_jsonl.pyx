@@ -0,0 +1,255 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Cython JSON Lines encoder for MAVLink messages
+
+Used by mavlink_proxy_with_json.py when built; the orjson path is used
+otherwise. Build in place with:
+
+    cythonize -3 --inplace fast_jsonl.pyx
+"""
+
+from cpython.bytearray cimport PyByteArray_AS_STRING, PyByteArray_GET_SIZE, PyByteArray_Resize
+from cpython.long cimport PyLong_AsLongLongAndOverflow
+from libc.math cimport isfinite
+from libc.string cimport memcpy, strlen
+
+cdef extern from "Python.h":
+    const char* PyUnicode_AsUTF8AndSize(object unicode, Py_ssize_t *size) except NULL
+    char* PyOS_double_to_string(double val, char format_code, int precision, int flags, int *ptype) except NULL
+    void PyMem_Free(void *p)
+    int Py_DTSF_ADD_DOT_0
+
+cdef const char* HEX_DIGITS = b"0123456789abcdef"
+
+cdef int _append(bytearray out, const char* data, Py_ssize_t size) except -1:
+    """Append size bytes of data to out"""
+    cdef Py_ssize_t old_size = PyByteArray_GET_SIZE(out)
+    PyByteArray_Resize(out, old_size + size)
+    memcpy(PyByteArray_AS_STRING(out) + old_size, data, size)
+    return 0
+
+cdef inline int _append_cstr(bytearray out, const char* data) except -1:
+    """Append a NUL-terminated C string to out"""
+    return _append(out, data, strlen(data))
+
+cdef int _append_float_repr(bytearray out, const char* float_repr) except -1:
+    """Append a repr()-formatted float, writing the exponent the way orjson does"""
+    cdef char buf[32]
+    cdef Py_ssize_t size = 0
+    cdef const char* p = float_repr
+
+    # repr() writes 1e-07 and 1e+16, orjson writes 1e-7 and 1e16
+    while p[0] and p[0] != c'e':
+        buf[size] = p[0]
+        size += 1
+        p += 1
+    if p[0] == c'e':
+        buf[size] = c'e'
+        size += 1
+        p += 1
+        if p[0] == c'-':
+            buf[size] = c'-'
+            size += 1
+            p += 1
+        elif p[0] == c'+':
+            p += 1
+        while p[0] == c'0' and p[1]:
+            p += 1
+        while p[0]:
+            buf[size] = p[0]
+            size += 1
+            p += 1
+    return _append(out, buf, size)
+
+cdef int _append_str(bytearray out, str value) except -1:
+    """Append value as a quoted, escaped JSON string"""
+    cdef Py_ssize_t size
+    cdef const char* data = PyUnicode_AsUTF8AndSize(value, &size)
+    cdef Py_ssize_t i
+    cdef Py_ssize_t start = 0
+    cdef unsigned char c
+    cdef char escape[6]
+
+    _append(out, b'"', 1)
+    for i in range(size):
+        c = <unsigned char>data[i]
+        if c >= 0x20 and c != c'"' and c != c'\\':
+            continue
+
+        # Flush the run of plain characters before the one being escaped
+        if i > start:
+            _append(out, data + start, i - start)
+        start = i + 1
+
+        if c == c'"':
+            _append(out, b'\\"', 2)
+        elif c == c'\\':
+            _append(out, b'\\\\', 2)
+        elif c == c'\n':
+            _append(out, b'\\n', 2)
+        elif c == c'\r':
+            _append(out, b'\\r', 2)
+        elif c == c'\t':
+            _append(out, b'\\t', 2)
+        else:
+            escape[0] = c'\\'
+            escape[1] = c'u'
+            escape[2] = c'0'
+            escape[3] = c'0'
+            escape[4] = HEX_DIGITS[c >> 4]
+            escape[5] = HEX_DIGITS[c & 0xf]
+            _append(out, escape, 6)
+
+    if size > start:
+        _append(out, data + start, size - start)
+    _append(out, b'"', 1)
+    return 0
+
+cdef int _append_long(bytearray out, long long value) except -1:
+    """Append a C integer as a JSON number"""
+    cdef char buf[24]
+    cdef char* p = buf + sizeof(buf)
+    cdef unsigned long long magnitude = <unsigned long long>value
+
+    # Digits are written backwards from the end of buf
+    if value < 0:
+        magnitude = 0 - magnitude
+    while True:
+        p -= 1
+        p[0] = <char>(c'0' + magnitude % 10)
+        magnitude //= 10
+        if magnitude == 0:
+            break
+    if value < 0:
+        p -= 1
+        p[0] = c'-'
+    return _append(out, p, buf + sizeof(buf) - p)
+
+cdef int _append_int(bytearray out, object value) except -1:
+    """Append a Python int as a JSON number"""
+    cdef int overflow
+    cdef long long int_value = PyLong_AsLongLongAndOverflow(value, &overflow)
+    cdef bytes digits
+
+    if overflow == 0:
+        return _append_long(out, int_value)
+
+    # uint64_t fields above LLONG_MAX
+    digits = str(value).encode('ascii')
+    return _append(out, digits, len(digits))
+
+cdef int _append_double(bytearray out, double value) except -1:
+    """Append a double as a JSON number, or null if it isn't finite"""
+    cdef char* float_repr
+
+    if not isfinite(value):
+        return _append(out, b"null", 4)
+
+    float_repr = PyOS_double_to_string(value, c'r', 0, Py_DTSF_ADD_DOT_0, NULL)
+    try:
+        _append_float_repr(out, float_repr)
+    finally:
+        PyMem_Free(float_repr)
+    return 0
+
+cdef int _append_value(bytearray out, object value, object default) except -1:
+    """Append value as JSON, converting unsupported types with default"""
+    cdef bint first
+
+    if value is None:
+        _append(out, b"null", 4)
+    elif value is True:
+        _append(out, b"true", 4)
+    elif value is False:
+        _append(out, b"false", 5)
+    elif isinstance(value, int):
+        _append_int(out, value)
+    elif isinstance(value, float):
+        _append_double(out, value)
+    elif isinstance(value, str):
+        _append_str(out, value)
+    elif isinstance(value, (list, tuple)):
+        _append(out, b"[", 1)
+        first = True
+        for item in value:
+            if not first:
+                _append(out, b",", 1)
+            first = False
+            _append_value(out, item, default)
+        _append(out, b"]", 1)
+    else:
+        _append_value(out, default(value), default)
+    return 0
+
+cdef int _append_number(bytearray out, object value, char kind, object default) except -1:
+    """Append a numeric field value (or array of them) of the given kind"""
+    cdef bint first
+
+    if kind == c'f' and type(value) is float:
+        return _append_double(out, value)
+    if kind == c'i' and type(value) is int:
+        return _append_int(out, value)
+    if type(value) is list:
+        _append(out, b"[", 1)
+        first = True
+        for item in <list>value:
+            if not first:
+                _append(out, b",", 1)
+            first = False
+            _append_number(out, item, kind, default)
+        return _append(out, b"]", 1)
+
+    # Not the type the message definition promised
+    return _append_value(out, value, default)
+
+def encode_and_append(bytearray out, str timestamp, long long system_id,
+                      long long component_id, bytes id_fragment, long long seq,
+                      str direction, bytes payload_fragment, tuple keys,
+                      tuple values, default, bytes kinds=None):
+    """
+    Append one JSON log line for a MAVLink message to out
+
+    id_fragment and payload_fragment are the pre-encoded
+    ',"msg_id":..,"msg_name":".."' and ',"payload":{"mavpackettype":".."'
+    parts for the message type, spliced in as-is. keys holds the
+    pre-encoded ',"<field>":' fragment for each payload field and values
+    the matching field values. For messages whose fields are all
+    numeric, kinds has one byte per field (b'i' for integer and b'f' for
+    floating point types) so values are formatted without generic type
+    dispatch. On error out is left unchanged.
+    """
+    cdef Py_ssize_t start = PyByteArray_GET_SIZE(out)
+    cdef Py_ssize_t i
+    cdef bytes key
+    cdef const char* kind_codes
+
+    try:
+        _append_cstr(out, b'{"timestamp":')
+        _append_str(out, timestamp)
+        _append_cstr(out, b',"system_id":')
+        _append_long(out, system_id)
+        _append_cstr(out, b',"component_id":')
+        _append_long(out, component_id)
+        _append(out, id_fragment, len(id_fragment))
+        _append_cstr(out, b',"seq":')
+        _append_long(out, seq)
+        _append_cstr(out, b',"direction":')
+        _append_str(out, direction)
+        _append(out, payload_fragment, len(payload_fragment))
+
+        if kinds is not None and len(kinds) == len(keys):
+            kind_codes = kinds
+            for i in range(len(keys)):
+                key = keys[i]
+                _append(out, key, len(key))
+                _append_number(out, values[i], kind_codes[i], default)
+        else:
+            for i in range(len(keys)):
+                key = keys[i]
+                _append(out, key, len(key))
+                _append_value(out, values[i], default)
+
+        _append(out, b"}}\n", 3)
+    except BaseException:
+        PyByteArray_Resize(out, start)
+        raise
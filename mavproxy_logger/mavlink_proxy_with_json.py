@@ -10,22 +10,215 @@ This version:
 - Maintains QGC connection stability
 """
 
+import importlib
+import io
+import logging
+import logging.handlers
+import math
+import queue
+import selectors
 import subprocess
 import time
 import os
 import signal
-import sys
-import json
+import socket
+import struct
 import threading
+from collections import deque
 from datetime import datetime, timezone
+from operator import attrgetter
 from pymavlink import mavutil
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    try:
+        import ujson as json
+    except ImportError:
+        import json
+
+try:
+    # Optional Cython encoder, see fast_jsonl.pyx
+    import fast_jsonl
+except ImportError:
+    fast_jsonl = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# MAVLink 2 module of pymavlink's active dialect (it decodes MAVLink 1 frames
+# too); mavutil.mavlink stays MAVLink 1 until a connection switches it
+mavlink2 = importlib.import_module(f"pymavlink.dialects.v20.{mavutil.current_dialect}")
+
+# JSON log buffering: writes are coalesced in memory and flushed periodically
+JSON_LOG_BUFFER_SIZE = 1 << 20  # 1 MiB
+JSON_LOG_FLUSH_INTERVAL = 1.0  # seconds
+
+# Messages waiting for the JSON writer thread; the oldest are dropped when full
+JSON_QUEUE_SIZE = 20_000
+
+# Encoded lines are appended to one reused buffer, written out once it fills
+JSON_WRITE_CHUNK = 32 << 10  # 32 KiB
+
+# zstd compression of the JSON log, done on its own thread
+JSON_ZSTD_LEVEL = 3
+JSON_COMPRESS_QUEUE_SIZE = 64  # chunks of up to JSON_WRITE_CHUNK bytes
+
+# Receive buffer for the JSON logger's UDP socket (12 MiB)
+JSON_RCVBUF_SIZE = 12_582_912
+
+# Polling used when tailing MAVProxy's tlog as the JSON message source
+TLOG_READ_SIZE = 64 << 10  # 64 KiB
+TLOG_POLL_INTERVAL = 0.05  # seconds
+
+# tlog records are a big-endian microsecond timestamp followed by a raw MAVLink frame
+_TLOG_TIMESTAMP = struct.Struct('>Q')
+
+# MAVProxy stores the link number in the low 2 bits of the tlog timestamp of
+# received messages, and link 3 for messages it sends itself
+_TLOG_LINK_MASK = 3
+_TLOG_TX_LINK = 3
+
+# Field names, value getter, encoded ',"<field>":' keys, numeric field kinds,
+# Cython encoder choice and JSON header fragments per MAVLink message ID,
+# filled on first sight
+_FIELDS_CACHE = {}
+
+# MAVLink field types the Cython encoder formats without type dispatch
+_FLOAT_FIELD_TYPES = ('float', 'double')
+_INT_FIELD_TYPES = ('int', 'uint')  # prefixes: int8_t ... uint64_t
+
+# Errors raised while logging messages are rate limited and written to a rotating file
+ERROR_LOG_INTERVAL = 1.0  # seconds
+ERROR_LOG_MAX_BYTES = 1 << 20  # 1 MiB
+ERROR_LOG_BACKUP_COUNT = 3
+
+logger = logging.getLogger(__name__)
+
+def _json_default(obj):
+    """Fallback encoder for values the JSON library can't serialize natively"""
+    if isinstance(obj, bytes):
+        # char[] fields, decoded the same way as pymavlink's to_dict()
+        return obj.decode('utf-8', errors='backslashreplace').rstrip('\x00')
+    if isinstance(obj, bytearray):
+        return obj.decode('utf-8', errors='replace')
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _finite_or_none(obj):
+    """Return obj with NaN and infinite floats replaced by None, as orjson writes them"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite_or_none(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite_or_none(value) for value in obj]
+    return obj
+
+def encode_json_line(obj):
+    """Serialize obj to a newline-terminated UTF-8 JSON line"""
+    if orjson is not None:
+        return orjson.dumps(
+            obj,
+            default=_json_default,
+            option=orjson.OPT_APPEND_NEWLINE
+        )
+
+    # orjson and fast_jsonl write NaN and Infinity as null; the fallbacks
+    # would write them as NaN/Infinity, which isn't valid JSON
+    try:
+        line = json.dumps(obj, default=_json_default, allow_nan=False)
+    except (ValueError, OverflowError):
+        line = json.dumps(_finite_or_none(obj), default=_json_default, allow_nan=False)
+    return (line + '\n').encode('utf-8')
+
+def get_numeric_kinds(fieldtypes):
+    """Return one kind byte per field (b'i' or b'f'), or None if any field isn't numeric"""
+    kinds = bytearray()
+    for fieldtype in fieldtypes:
+        if fieldtype in _FLOAT_FIELD_TYPES:
+            kinds += b'f'
+        elif fieldtype.startswith(_INT_FIELD_TYPES):
+            kinds += b'i'
+        else:
+            return None
+    return bytes(kinds)
+
+def build_json_fragments(msg_id, msg_name):
+    """Return the encoded ',"msg_id":..,"msg_name":".."' and ',"payload":{"mavpackettype":".."' fragments"""
+    return (
+        f',"msg_id":{msg_id},"msg_name":"{msg_name}"'.encode('utf-8'),
+        f',"payload":{{"mavpackettype":"{msg_name}"'.encode('utf-8')
+    )
+
+# JSON fragments for every message of the active dialect, spliced into
+# log lines by the Cython encoder
+MSG_ID_TO_JSON_FRAGMENT = {
+    msg_id: build_json_fragments(msg_id, msg_type.msgname)
+    for msg_id, msg_type in mavlink2.mavlink_map.items()
+}
+
+def get_message_fields(msg):
+    """Return (field names, values getter, encoded JSON keys, numeric kinds, use fast_jsonl, JSON fragments) for msg's type"""
+    msg_id = msg._header.msgId
+    cached = _FIELDS_CACHE.get(msg_id)
+    if cached is None:
+        fields = tuple(msg.get_fieldnames())
+        if len(fields) > 1:
+            getter = attrgetter(*fields)
+        elif fields:
+            single = attrgetter(fields[0])
+            getter = lambda m: (single(m),)
+        else:
+            getter = lambda m: ()
+        keys = tuple(f',"{name}":'.encode('utf-8') for name in fields)
+
+        # fieldtypes follows the fieldnames order; char[] fields make a message non-numeric
+        fieldtypes = getattr(msg, 'fieldtypes', ())
+        kinds = get_numeric_kinds(fieldtypes) if fields and len(fieldtypes) == len(fields) else None
+
+        # fast_jsonl formats floats with repr(), which is slower than orjson,
+        # so messages with float fields stay on the orjson path when available
+        has_floats = any(fieldtype in _FLOAT_FIELD_TYPES for fieldtype in fieldtypes)
+        use_fast_jsonl = fast_jsonl is not None and (orjson is None or not has_floats)
+
+        # BAD_DATA and messages outside the dialect have no prebuilt fragments
+        fragments = MSG_ID_TO_JSON_FRAGMENT.get(msg_id) or build_json_fragments(msg_id, msg._type)
+
+        cached = _FIELDS_CACHE[msg_id] = (fields, getter, keys, kinds, use_fast_jsonl, fragments)
+    return cached
+
+def open_json_log(filename):
+    """Open a JSON log file for buffered, appending binary writes"""
+    # Raw binary file opened for appending; entries are already UTF-8 bytes
+    fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    return io.BufferedWriter(
+        io.FileIO(fd, 'w', closefd=True),
+        buffer_size=JSON_LOG_BUFFER_SIZE
+    )
+
+def write_all(fd, data):
+    """Write all of data to fd, retrying short writes"""
+    written = os.write(fd, data)
+    if written < len(data):
+        # Release the view before returning so a bytearray can be resized again
+        with memoryview(data) as view:
+            while written < len(view):
+                written += os.write(fd, view[written:])
+
 class MAVProxyWithJSON:
     def __init__(self,
                  px4_connection='udp:127.0.0.1:14550',
                  qgc_port=14551,
                  json_port=14552,  # Separate port for JSON logging
-                 log_dir='logs'):
+                 log_dir='logs',
+                 json_source='udp',
+                 log_msg_ids=None,
+                 drop_msg_ids=None,
+                 compress_json=True,
+                 json_queue_size=JSON_QUEUE_SIZE):
         """
         Initialize MAVProxy with JSON logging
 
@@ -34,22 +227,71 @@ class MAVProxyWithJSON:
             qgc_port: Port for QGC to connect to
             json_port: Port for JSON logger to connect to
             log_dir: Directory for log files
+            json_source: Where the JSON logger reads messages from: 'udp' for a
+                dedicated MAVProxy output on json_port, 'tlog' to tail the
+                tlog MAVProxy is already writing (no extra output, but it
+                also holds outbound traffic, logged as 'TX')
+            log_msg_ids: If given, only these MAVLink message IDs are JSON logged
+            drop_msg_ids: MAVLink message IDs never JSON logged (e.g. high-rate
+                telemetry such as HIGHRES_IMU that the tlog already captures)
+            compress_json: zstd-compress the JSON log (.jsonl.zst); needs the
+                zstandard package, otherwise an uncompressed .jsonl is written
+            json_queue_size: Messages held for the JSON writer thread; when it
+                falls behind (e.g. a disk stall) the oldest are dropped
         """
+        if json_source not in ('udp', 'tlog'):
+            raise ValueError(f"Unknown JSON source: {json_source}")
+
         self.px4_connection = px4_connection
         self.qgc_port = qgc_port
         self.json_port = json_port
         self.log_dir = log_dir
+        self.json_source = json_source
+        self.log_msg_ids = frozenset(log_msg_ids) if log_msg_ids is not None else None
+        self.drop_msg_ids = frozenset(drop_msg_ids or ())
+        self.compress_json = compress_json
 
         # Create log directory
         os.makedirs(log_dir, exist_ok=True)
 
         # MAVProxy process
         self.mavproxy_process = None
+        self.tlog_filename = None
 
         # JSON logging
         self.json_logger = None
         self.json_log_file = None
         self.json_logging_enabled = True
+        self.json_writer = None
+        self.json_queue = deque(maxlen=json_queue_size)
+        self.json_queue_ready = threading.Event()
+        self.json_dropped = 0
+        self.json_compressor = None
+        self.json_compress_queue = None
+        self.json_compress_stream = None
+
+        # Reusable JSON entry, filled in place for every logged message
+        self._json_entry = {
+            "timestamp": None,
+            "system_id": None,
+            "component_id": None,
+            "msg_id": None,
+            "msg_name": None,
+            "seq": None,
+            "direction": None,
+            "payload": None
+        }
+
+        # Cached "YYYY-MM-DDTHH:MM:SS." prefix for the current second
+        self._ts_second = None
+        self._ts_prefix = ''
+
+        # Error logging
+        self.error_log_handler = None
+        self.error_console_handler = None
+        self._error_lock = threading.Lock()
+        self._last_error_time = float('-inf')
+        self._suppressed_errors = 0
 
     def setup_logging(self):
         """Setup MAVProxy logging"""
@@ -59,101 +301,421 @@ class MAVProxyWithJSON:
         print(f"✓ MAVProxy logging to: {log_filename}")
         return log_filename
 
+    def setup_error_logging(self):
+        """Setup rotating error log for the JSON logger threads"""
+        if self.error_log_handler:
+            return
+
+        error_log_filename = f"{self.log_dir}/json_logger_errors.log"
+        self.error_log_handler = logging.handlers.RotatingFileHandler(
+            error_log_filename,
+            maxBytes=ERROR_LOG_MAX_BYTES,
+            backupCount=ERROR_LOG_BACKUP_COUNT
+        )
+        self.error_log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+
+        self.error_console_handler = logging.StreamHandler()
+        self.error_console_handler.setFormatter(logging.Formatter("✗ %(message)s"))
+
+        # Added to the shared module logger, so stop() removes them again
+        logger.addHandler(self.error_log_handler)
+        logger.addHandler(self.error_console_handler)
+        logger.setLevel(logging.WARNING)
+
+    def log_error(self, message, error):
+        """Log an error from the message path, at most once per ERROR_LOG_INTERVAL"""
+        now = time.monotonic()
+        with self._error_lock:
+            if now - self._last_error_time < ERROR_LOG_INTERVAL:
+                self._suppressed_errors += 1
+                return
+            self._last_error_time = now
+            suppressed = self._suppressed_errors
+            self._suppressed_errors = 0
+
+        if suppressed:
+            logger.error("%s: %s (%d more errors suppressed)", message, error, suppressed)
+        else:
+            logger.error("%s: %s", message, error)
+
     def setup_json_logging(self):
         """Setup JSON logging for MAVLink messages"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         json_log_filename = f"{self.log_dir}/mavlink_messages_{timestamp}.jsonl"
 
+        compress = self.compress_json
+        if compress and zstandard is None:
+            print("✗ zstandard not installed, JSON log will not be compressed")
+            compress = False
+
         try:
-            self.json_log_file = open(json_log_filename, 'w', encoding='utf-8')
+            self.setup_error_logging()
+            if compress:
+                compress = self.setup_json_compression(json_log_filename + ".zst")
+            if compress:
+                json_log_filename += ".zst"
+            else:
+                self.json_log_file = open_json_log(json_log_filename)
             print(f"✓ JSON logging to: {json_log_filename}")
             return True
         except Exception as e:
             print(f"✗ Failed to setup JSON logging: {e}")
             return False
 
-    def make_json_serializable(self, obj):
-        """Convert objects to JSON-serializable format"""
-        if isinstance(obj, bytearray):
-            return obj.decode('utf-8', errors='replace')
-        elif isinstance(obj, bytes):
-            return obj.decode('utf-8', errors='replace')
-        elif isinstance(obj, dict):
-            return {key: self.make_json_serializable(value) for key, value in obj.items()}
-        elif isinstance(obj, list):
-            return [self.make_json_serializable(item) for item in obj]
-        elif isinstance(obj, tuple):
-            return [self.make_json_serializable(item) for item in obj]
-        else:
-            return obj
+    def setup_json_compression(self, json_log_filename):
+        """Open a zstd-compressed JSON log, returning False if compression can't be set up"""
+        self.json_log_file = open_json_log(json_log_filename)
+        # An existing log of the same name is appended to, not replaced
+        created_empty = os.fstat(self.json_log_file.fileno()).st_size == 0
+        try:
+            # Built here rather than on the compression thread, so a failure
+            # falls back to an uncompressed log instead of stalling the writer
+            compressor = zstandard.ZstdCompressor(level=JSON_ZSTD_LEVEL)
+            # The file is closed by stop() once the frame is finished
+            self.json_compress_stream = compressor.stream_writer(self.json_log_file, closefd=False)
+        except Exception as e:
+            print(f"✗ Failed to setup JSON log compression, JSON log will not be compressed: {e}")
+            self.json_log_file.close()
+            self.json_log_file = None
+            # Only remove the file if this call created it
+            if created_empty:
+                os.remove(json_log_filename)
+            return False
+
+        # Bounded so a slow compressor pushes back on the writer thread
+        self.json_compress_queue = queue.Queue(maxsize=JSON_COMPRESS_QUEUE_SIZE)
+        return True
+
+    def _format_ts(self, t_ns):
+        """Format epoch nanoseconds as an ISO 8601 UTC timestamp"""
+        second, ns = divmod(t_ns, 1_000_000_000)
+        if second != self._ts_second:
+            self._ts_second = second
+            self._ts_prefix = datetime.fromtimestamp(second, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.")
+        return f"{self._ts_prefix}{ns // 1000:06d}+00:00"
 
-    def log_mavlink_message(self, msg, direction='RX'):
-        """Log a MAVLink message to JSON"""
+    def log_mavlink_message(self, msg, direction='RX', timestamp=None):
+        """Queue a MAVLink message (timestamp in epoch nanoseconds) for the JSON writer thread"""
         if not self.json_log_file or not self.json_logging_enabled:
             return
 
-        try:
-            timestamp = datetime.now(timezone.utc).isoformat()
-            msg_type = msg.get_type()
-            msg_id = msg.get_msgId()
-
-            # Prepare message data
-            msg_dict = msg.to_dict()
-
-            # Create JSON entry
-            json_entry = {
-                "timestamp": timestamp,
-                "system_id": msg.get_srcSystem(),
-                "component_id": msg.get_srcComponent(),
-                "msg_id": msg_id,
-                "msg_name": msg_type,
-                "seq": msg.get_seq(),
-                "direction": direction,
-                "payload": self.make_json_serializable(msg_dict)
-            }
-
-            # Write to JSON file
-            self.json_log_file.write(json.dumps(json_entry) + '\n')
-            self.json_log_file.flush()
+        # Filtered messages are dropped before any encoding work
+        msg_id = msg.get_msgId()
+        if msg_id in self.drop_msg_ids:
+            return
+        if self.log_msg_ids is not None and msg_id not in self.log_msg_ids:
+            return
 
-        except Exception as e:
-            print(f"✗ JSON logging error: {e}")
+        # Only an integer is captured here; the writer thread formats it
+        if timestamp is None:
+            timestamp = time.time_ns()
+
+        # A full deque discards its oldest entry on append
+        if len(self.json_queue) == self.json_queue.maxlen:
+            self.json_dropped += 1
+
+        self.json_queue.append((timestamp, msg, direction))
+        self.json_queue_ready.set()
+
+    def append_mavlink_message(self, out, timestamp, msg, direction):
+        """Append a MAVLink message to the bytearray out as a JSON line"""
+        # Header fields all live on the message's MAVLink_header
+        header = msg._header
+        fields, getter, keys, kinds, use_fast_jsonl, fragments = get_message_fields(msg)
+
+        if use_fast_jsonl:
+            fast_jsonl.encode_and_append(
+                out,
+                self._format_ts(timestamp),
+                header.srcSystem,
+                header.srcComponent,
+                fragments[0],
+                header.seq,
+                direction,
+                fragments[1],
+                keys,
+                getter(msg),
+                _json_default,
+                kinds
+            )
+            return
+
+        # Fill in JSON entry (bytes fields are decoded by the encoder)
+        json_entry = self._json_entry
+        json_entry["timestamp"] = self._format_ts(timestamp)
+        json_entry["system_id"] = header.srcSystem
+        json_entry["component_id"] = header.srcComponent
+        json_entry["msg_id"] = header.msgId
+        json_entry["msg_name"] = msg._type
+        json_entry["seq"] = header.seq
+        json_entry["direction"] = direction
+
+        # Build the payload straight from the message attributes (same
+        # layout as msg.to_dict(), without the per-field format_attr calls)
+        payload = {"mavpackettype": msg._type}
+        payload.update(zip(fields, getter(msg)))
+        json_entry["payload"] = payload
+
+        out += encode_json_line(json_entry)
+
+    def tail_tlog(self, tlog_filename):
+        """
+        Yield (timestamp_ns, message, direction) tuples from a tlog as MAVProxy writes it
+
+        The tlog holds what MAVProxy sends as well as what it receives.
+        Messages MAVProxy sends itself are tagged with link 3 in the
+        timestamp; GCS traffic forwarded to the vehicle is logged with a
+        plain timestamp, so it is recognised by its sender having sent a
+        GCS heartbeat. Both are yielded with direction 'TX', everything
+        else with 'RX'.
+        """
+        mavlink = mavlink2
+        mav = mavlink.MAVLink(None)
+        gcs_systems = set()
+
+        # MAVProxy creates the tlog shortly after starting
+        while not os.path.exists(tlog_filename):
+            if not self.json_logging_enabled:
+                return
+            time.sleep(TLOG_POLL_INTERVAL)
+
+        with open(tlog_filename, 'rb') as tlog:
+            buf = bytearray()
+            while self.json_logging_enabled:
+                data = tlog.read(TLOG_READ_SIZE)
+                if not data:
+                    time.sleep(TLOG_POLL_INTERVAL)
+                    continue
+                buf += data
+
+                # Decode every complete record; a partial one waits for the next read
+                pos = 0
+                while len(buf) - pos >= 11:
+                    magic = buf[pos + 8]
+                    if magic == mavlink.PROTOCOL_MARKER_V2:
+                        size = buf[pos + 9] + 12
+                        if buf[pos + 10] & mavlink.MAVLINK_IFLAG_SIGNED:
+                            size += mavlink.MAVLINK_SIGNATURE_BLOCK_LEN
+                    elif magic == mavlink.PROTOCOL_MARKER_V1:
+                        size = buf[pos + 9] + 8
+                    else:
+                        # Lost sync, scan forward for the next frame
+                        pos += 1
+                        continue
+
+                    end = pos + 8 + size
+                    if end > len(buf):
+                        break
+
+                    try:
+                        msg = mav.decode(buf[pos + 8:end])
+                    except mavlink.MAVError:
+                        pos += 1
+                        continue
+
+                    (usec,) = _TLOG_TIMESTAMP.unpack_from(buf, pos)
+                    pos = end
+
+                    src_system = msg.get_srcSystem()
+                    if (msg.get_msgId() == mavlink.MAVLINK_MSG_ID_HEARTBEAT
+                            and msg.type == mavlink.MAV_TYPE_GCS):
+                        gcs_systems.add(src_system)
+
+                    if (usec & _TLOG_LINK_MASK) == _TLOG_TX_LINK or src_system in gcs_systems:
+                        direction = 'TX'
+                    else:
+                        direction = 'RX'
+                    yield usec * 1000, msg, direction
+
+                del buf[:pos]
 
     def start_json_logger(self):
-        """Start JSON logger thread"""
+        """Start JSON logger and writer threads"""
         if not self.setup_json_logging():
             return False
 
+        def json_tlog_thread():
+            """JSON logger thread function (tails MAVProxy's tlog)"""
+            try:
+                print(f"✓ JSON logger reading MAVProxy log: {self.tlog_filename}")
+
+                for timestamp, msg, direction in self.tail_tlog(self.tlog_filename):
+                    self.log_mavlink_message(msg, direction, timestamp)
+
+            except Exception as e:
+                if self.json_logging_enabled:
+                    print(f"✗ JSON logger error: {e}")
+
         def json_logger_thread():
-            """JSON logger thread function"""
+            """JSON logger thread function (receives messages only)"""
             try:
                 # Connect to MAVProxy's JSON output port
                 json_connection = f"udp:127.0.0.1:{self.json_port}"
                 master = mavutil.mavlink_connection(json_connection)
 
+                # Enlarge the socket receive buffer to absorb telemetry bursts
+                try:
+                    master.port.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, JSON_RCVBUF_SIZE)
+                except (AttributeError, OSError) as e:
+                    print(f"✗ Failed to set JSON logger receive buffer: {e}")
+
                 print("✓ JSON logger connected to MAVProxy JSON output")
 
+                # Wait for the socket with epoll (or the platform's best selector)
+                selector = selectors.DefaultSelector()
+                selector.register(master.port, selectors.EVENT_READ)
+
                 while self.json_logging_enabled:
                     try:
-                        # Get next message from MAVProxy
-                        msg = master.recv_match(blocking=True, timeout=1.0)
-
-                        if msg is None:
+                        if not selector.select(timeout=1.0):
                             continue
 
-                        # Log the message
-                        self.log_mavlink_message(msg, 'RX')
+                        # Drain every queued datagram before waiting again,
+                        # stopping early once stop() has been called
+                        while self.json_logging_enabled:
+                            msg = master.recv_match(blocking=False)
+                            if msg is None:
+                                break
+
+                            # Hand the message to the writer thread
+                            self.log_mavlink_message(msg, 'RX')
 
                     except Exception as e:
                         if self.json_logging_enabled:
                             print(f"✗ JSON logger error: {e}")
                         break
 
+                selector.close()
+
             except Exception as e:
                 print(f"✗ JSON logger connection failed: {e}")
 
+        def json_writer_thread():
+            """JSON writer thread function (encodes and writes messages)"""
+            json_queue = self.json_queue
+            compress_queue = self.json_compress_queue
+            fd = self.json_log_file.fileno()
+            last_flush = time.monotonic()
+            dropped_reported = 0
+
+            # Encoded lines waiting to be written, appended to one bytearray
+            # instead of collecting a list of line objects. clear() releases
+            # its storage, so each chunk grows it again; that costs a few
+            # microseconds per chunk, less than tracking a fill length with
+            # slice assignment would
+            scratch = bytearray()
+
+            def write_scratch():
+                """Hand scratch to the compressor or write it out, then empty it"""
+                try:
+                    if compress_queue is not None:
+                        compress_queue.put(bytes(scratch))
+                    else:
+                        write_all(fd, scratch)
+                except Exception as e:
+                    self.log_error("JSON writer error", e)
+                scratch.clear()
+
+            while True:
+                # Read the flag before draining so nothing queued before stop() is lost
+                running = self.json_logging_enabled
+
+                # Drain what is queued now rather than until empty, so the
+                # periodic flush and drop report below still run under overload
+                queued = len(json_queue)
+                for _ in range(queued):
+                    timestamp, msg, direction = json_queue.popleft()
+                    try:
+                        self.append_mavlink_message(scratch, timestamp, msg, direction)
+                    except Exception as e:
+                        self.log_error("JSON logging error", e)
+                        continue
+
+                    if len(scratch) >= JSON_WRITE_CHUNK:
+                        write_scratch()
+
+                if not queued:
+                    if not running:
+                        break
+                    self.json_queue_ready.wait(JSON_LOG_FLUSH_INTERVAL)
+                    self.json_queue_ready.clear()
+
+                # Periodically write out a partial chunk and report dropped messages
+                now = time.monotonic()
+                elapsed = now - last_flush
+                if elapsed >= JSON_LOG_FLUSH_INTERVAL:
+                    last_flush = now
+                    if scratch:
+                        write_scratch()
+
+                    # A stalled write can stretch the interval, so report the real one
+                    dropped = self.json_dropped
+                    if dropped != dropped_reported:
+                        logger.warning("JSON queue full, dropped=%d in last %.0fs",
+                                       dropped - dropped_reported, elapsed)
+                        dropped_reported = dropped
+
+            # Final partial chunk goes to the compressor, or through the
+            # buffered file which is flushed on close
+            if compress_queue is not None:
+                if scratch:
+                    write_scratch()
+                compress_queue.put(None)
+            elif scratch:
+                try:
+                    self.json_log_file.write(scratch)
+                except Exception as e:
+                    self.log_error("JSON writer error", e)
+
+        def json_compress_thread():
+            """JSON compression thread function (zstd-compresses written chunks)"""
+            compress_queue = self.json_compress_queue
+            stream = self.json_compress_stream
+            last_flush = time.monotonic()
+            pending = False
+
+            while True:
+                try:
+                    chunk = compress_queue.get(timeout=JSON_LOG_FLUSH_INTERVAL)
+                except queue.Empty:
+                    chunk = b''
+                if chunk is None:
+                    break
+
+                try:
+                    if chunk:
+                        stream.write(chunk)
+                        pending = True
+
+                    # Periodically end the current block so what has been
+                    # logged so far can be decompressed from the file
+                    now = time.monotonic()
+                    if pending and now - last_flush >= JSON_LOG_FLUSH_INTERVAL:
+                        last_flush = now
+                        stream.flush(zstandard.FLUSH_BLOCK)
+                        pending = False
+                except Exception as e:
+                    self.log_error("JSON compression error", e)
+
+            try:
+                stream.flush(zstandard.FLUSH_FRAME)
+            except Exception as e:
+                self.log_error("JSON compression error", e)
+
+        # Start JSON compression thread
+        if self.json_compress_queue is not None:
+            self.json_compressor = threading.Thread(target=json_compress_thread, daemon=True)
+            self.json_compressor.start()
+
+        # Start JSON writer thread
+        self.json_writer = threading.Thread(target=json_writer_thread, daemon=True)
+        self.json_writer.start()
+
         # Start JSON logger thread
-        self.json_logger = threading.Thread(target=json_logger_thread, daemon=True)
+        if self.json_source == 'tlog':
+            self.json_logger = threading.Thread(target=json_tlog_thread, daemon=True)
+        else:
+            self.json_logger = threading.Thread(target=json_logger_thread, daemon=True)
         self.json_logger.start()
 
         return True
@@ -161,6 +723,7 @@ class MAVProxyWithJSON:
     def start_mavproxy(self):
         """Start MAVProxy with multiple outputs"""
         log_filename = self.setup_logging()
+        self.tlog_filename = log_filename
 
         # Check for virtual environment
         venv_path = os.path.join(os.path.dirname(__file__), 'mavproxy_env')
@@ -174,7 +737,10 @@ class MAVProxyWithJSON:
             mavproxy_cmd,
             '--master', self.px4_connection,
             '--out', f'udp:127.0.0.1:{self.qgc_port}',      # QGC connection
-            '--out', f'udp:127.0.0.1:{self.json_port}',    # JSON logger connection
+        ]
+        if self.json_source == 'udp':
+            cmd += ['--out', f'udp:127.0.0.1:{self.json_port}']    # JSON logger connection
+        cmd += [
             '--logfile', log_filename,
             '--daemon'  # Run in background
         ]
@@ -198,7 +764,10 @@ class MAVProxyWithJSON:
                 print("✓ MAVProxy started successfully")
                 print(f"✓ PX4 connection: {self.px4_connection}")
                 print(f"✓ QGC connection: udp:127.0.0.1:{self.qgc_port}")
-                print(f"✓ JSON logger connection: udp:127.0.0.1:{self.json_port}")
+                if self.json_source == 'udp':
+                    print(f"✓ JSON logger connection: udp:127.0.0.1:{self.json_port}")
+                else:
+                    print(f"✓ JSON logger source: {log_filename}")
                 print(f"✓ MAVProxy logging to: {log_filename}")
 
                 # Start JSON logger after MAVProxy is ready
@@ -229,18 +798,24 @@ class MAVProxyWithJSON:
 
     def run(self):
         """Run the forwarder"""
-        if not self.start_mavproxy():
-            return
-
         try:
-            # Keep running
-            while True:
-                time.sleep(1)
+            # Inside the try so Ctrl+C while MAVProxy is starting also stops it
+            if not self.start_mavproxy():
+                return
 
-                # Check if MAVProxy is still running
-                if self.mavproxy_process.poll() is not None:
-                    print("✗ MAVProxy stopped unexpectedly")
+            # Block until MAVProxy exits. Ctrl+C interrupts the wait on POSIX;
+            # elsewhere wake up once a second so it can be delivered
+            timeout = None if os.name == 'posix' else 1
+            while True:
+                try:
+                    self.mavproxy_process.wait(timeout=timeout)
                     break
+                except subprocess.TimeoutExpired:
+                    continue
+
+            print("✗ MAVProxy stopped unexpectedly")
+            # Still write out the JSON messages queued for the writer thread
+            self.stop()
 
         except KeyboardInterrupt:
             print("\n\n✓ Stopping MAVProxy...")
@@ -251,9 +826,26 @@ class MAVProxyWithJSON:
         # Stop JSON logging
         if self.json_logging_enabled:
             self.json_logging_enabled = False
+            # Let the writer thread drain the queue before closing the file
+            self.json_queue_ready.set()
+            if self.json_writer:
+                self.json_writer.join()
+            if self.json_compressor:
+                self.json_compressor.join()
             if self.json_log_file:
+                # Closing flushes any data still held in the buffer
                 self.json_log_file.close()
-                print("✓ JSON logging stopped")
+                print(f"✓ JSON logging stopped (dropped={self.json_dropped} messages in total)")
+
+            if self._suppressed_errors:
+                logger.error("%d further JSON logging errors suppressed", self._suppressed_errors)
+
+            for handler in (self.error_log_handler, self.error_console_handler):
+                if handler:
+                    logger.removeHandler(handler)
+                    handler.close()
+            self.error_log_handler = None
+            self.error_console_handler = None
 
         if self.mavproxy_process:
             try:
@@ -285,13 +877,13 @@ def main():
     # Create forwarder
     forwarder = MAVProxyWithJSON()
 
-    # Handle Ctrl+C gracefully
-    def signal_handler(sig, frame):
-        print("\n\n✓ Stopping forwarder...")
-        forwarder.stop()
-        sys.exit(0)
-
-    signal.signal(signal.SIGINT, signal_handler)
+    # Ctrl+C raises KeyboardInterrupt, which unwinds run()'s wait on MAVProxy
+    # before it stops the forwarder. Calling stop() from a signal handler
+    # would deadlock waiting on the process that wait() already holds
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    # SIGTERM takes the same path, so the JSON log (and a compressed log's
+    # zstd frame) is still finished when the forwarder is killed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
 
     # Run forwarder
     forwarder.run()